@@ -4,6 +4,7 @@ from __future__ import annotations
 Endpoints para métricas de riesgo
 SQLAlchemy 2.x compatible
 """
+import heapq
 from typing import List, Optional
 from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, Query
@@ -22,7 +23,7 @@ def get_risk_overview(
     top_n: int = Query(10, ge=1, le=200),
 ):
     """Return an aggregated risk overview as of the latest snapshot per asset.
-    Uses sqlite3 direct queries against the configured DATABASE_URL sqlite file (avoids SQLAlchemy/ORM).
+    Uses sqlite3 direct queries on a pooled connection to the configured DATABASE_URL sqlite file (avoids SQLAlchemy/ORM).
     """
     import sqlite3
     from config import settings
@@ -30,17 +31,16 @@ def get_risk_overview(
 
     log = logging.getLogger(__name__)
 
-    # Resolve SQLite file path from DATABASE_URL
-    db_url = settings.DATABASE_URL
-    if 'sqlite' not in db_url.lower():
+    # Raw sqlite3 queries below only work against a SQLite DATABASE_URL
+    if not settings.USE_SQLITE:
         raise HTTPException(status_code=500, detail="Risk overview requires a sqlite DATABASE_URL")
 
-    # support sqlite:///./wsw.db or sqlite:///<abs>
-    db_path = db_url.split('sqlite:///')[-1]
     try:
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
+        # Borrow a pooled DBAPI connection: sqlite3 keeps prepared statements per
+        # connection, so reusing it skips re-parsing these queries on every request
+        conn = engine.raw_connection()
         cur = conn.cursor()
+        cur.row_factory = sqlite3.Row
 
         # as_of
         cur.execute('SELECT MAX(ts) as max_ts FROM risk_snapshots')
@@ -155,15 +155,13 @@ def risk_summary_sql():
     import logging
 
     log = logging.getLogger(__name__)
-    db_url = settings.DATABASE_URL
-    if 'sqlite' not in db_url.lower():
+    if not settings.USE_SQLITE:
         raise HTTPException(status_code=500, detail="Risk summary SQL requires a sqlite DATABASE_URL")
 
-    db_path = db_url.split('sqlite:///')[-1]
     try:
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
+        conn = engine.raw_connection()
         cur = conn.cursor()
+        cur.row_factory = sqlite3.Row
 
         # as_of
         cur.execute('SELECT MAX(ts) as max_ts FROM risk_snapshots')
@@ -206,16 +204,17 @@ def risk_summary_sql():
         risk_keys = ['price_risk','fundamental_risk','liquidity_risk','counterparty_risk','regime_risk']
         top_risks: dict = {}
 
+        # One read of the as_of rows instead of one ORDER BY ... LIMIT 5 query
+        # per risk key; NULLs rank last, as with ORDER BY DESC in SQLite
+        cur.execute('''
+            SELECT asset_id, asset_name, group_name, subgroup_name, category_name, cri, price_risk, fundamental_risk, liquidity_risk, counterparty_risk, regime_risk
+            FROM risk_snapshots
+            WHERE ts = ?
+        ''', (as_of,))
+        latest = cur.fetchall()
+
         for rk in risk_keys:
-            q = f"""
-                SELECT asset_id, asset_name, group_name, subgroup_name, category_name, cri, price_risk, fundamental_risk, liquidity_risk, counterparty_risk, regime_risk
-                FROM risk_snapshots
-                WHERE ts = ?
-                ORDER BY {rk} DESC
-                LIMIT 5
-            """
-            cur.execute(q, (as_of,))
-            rows = cur.fetchall()
+            rows = heapq.nlargest(5, latest, key=lambda r: (r[rk] is not None, r[rk] or 0.0))
             lst = []
             for r in rows:
                 lst.append({
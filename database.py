@@ -4,9 +4,17 @@ SQLAlchemy 2.x compatible con text() para queries raw
 TIMESCALEDB:  optional, explicit ENABLE_TIMESCALE flag
 """
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from contextlib import contextmanager
+from functools import lru_cache
 from typing import Optional, Generator, Dict, Any
 from sqlalchemy import create_engine, text, MetaData
+from sqlalchemy.engine import make_url
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 # Redis and Neo4j are optional. Import if available, otherwise disable features gracefully.
@@ -30,69 +38,160 @@ logger = logging.getLogger(__name__)
 
 # ==================== POSTGRESQL/SQLITE ====================
 
+# Drivers DBAPI construidos sobre libpq
+LIBPQ_DRIVERS = {"psycopg2", "psycopg"}
+
+
+def _driver_name(url: str) -> str:
+    """Driver DBAPI de una URL SQLAlchemy ('' si no se puede resolver)"""
+    try:
+        return make_url(url).get_driver_name()
+    except Exception:
+        return ''
+
+
 engine_kwargs = {}
 if settings.USE_SQLITE:
     engine_kwargs = {"connect_args": {"check_same_thread": False}}
 else:
+    # Pool dimensionado para el threadpool de FastAPI (DB_POOL_*); LIFO mantiene calientes
+    # pocas conexiones. JIT desactivado: las consultas de la API son cortas y no lo amortizan.
+    # Conexiones obsoletas: los keepalives TCP de libpq solo detectan un peer
+    # inalcanzable (red caída, host muerto); NO un cierre del lado servidor
+    # (reinicio de la DB, idle timeout de servidor/proxy). Para eso:
+    # - pool_recycle (1 h) debe quedar por debajo del idle timeout del
+    #   servidor/proxy (p. ej. PgBouncer server_idle_timeout, balanceadores)
+    # - DB_POOL_PRE_PING (por defecto activo) hace un ping por checkout; sin él,
+    #   el primer checkout de una conexión cerrada por el servidor falla la petición
     engine_kwargs = {
-        "pool_pre_ping": True,
-        "pool_recycle": 300,
-        "pool_size":  5,
-        "max_overflow":  10
+        "pool_recycle": 3600,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_use_lifo": True,
     }
+    # Claves conninfo de libpq: solo psycopg2/psycopg las aceptan (pg8000,
+    # asyncpg... fallarían al conectar con argumentos desconocidos)
+    if _driver_name(settings.DATABASE_URL) in LIBPQ_DRIVERS:
+        engine_kwargs["connect_args"] = {
+            "options": "-c jit=off",
+            "application_name": "wsw-api",
+            "keepalives": 1,
+            "keepalives_idle": 30,
+            "keepalives_interval": 10,
+            "keepalives_count": 3,
+            "tcp_user_timeout": 15000,
+        }
 
 engine = create_engine(settings.DATABASE_URL, **engine_kwargs)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 metadata = MetaData()
 
-# ==================== REDIS (OPCIONAL) ====================
+# INSERT con soporte ON CONFLICT por dialecto (upserts en una sola sentencia).
+# None => el llamador usa la ruta genérica; los que usan RETURNING comprueban
+# además dialect.insert_returning (SQLite < 3.35 no lo soporta)
+DIALECT_INSERT = {
+    "postgresql": pg_insert,
+    "sqlite": sqlite_insert,
+}
 
-redis_client:  Optional["redis.Redis"] = None
-if settings.ENABLE_REDIS:
-    if redis is None:
-        logger.warning("⚠️  Redis package not installed; Redis disabled. Install `requirements-optional.txt` to enable.")
-    else:
-        try:
-            redis_client = redis.Redis.from_url(
-                settings.REDIS_URL,
-                decode_responses=True,
-                socket_connect_timeout=2,
-                socket_timeout=2,
-                retry_on_timeout=False
-            )
-            redis_client.ping()
-            logger.info("✅ Redis conectado exitosamente")
-        except Exception as e:
-            logger.warning(f"⚠️  Redis no disponible: {e}. Usando cache en memoria.")
-            redis_client = None
-else:
-    logger.info("ℹ️  Redis deshabilitado por configuración")
+# ==================== REDIS / NEO4J (OPCIONALES, PEREZOSOS) ====================
+# Los clientes se construyen en el primer uso (get_redis_client/get_neo4j_driver):
+# importar este módulo no hace E/S de red. Con EAGER_CONNECT=true se construyen
+# al importar. Redis se verifica con un ping en un hilo daemon; Neo4j se verifica
+# donde se usa (test_connections en el arranque y /health), sin flag propio
+
+# Resultado del ping a Redis: None = pendiente/deshabilitado, True/False = ping
+_REDIS_OK: Optional[bool] = None
+
+
+def mark_redis(ok: bool) -> None:
+    """Registrar el resultado del último ping a Redis (probe o ping en vivo)"""
+    global _REDIS_OK
+    _REDIS_OK = ok
+
+
+def redis_verified() -> bool:
+    """True solo si el último ping a Redis fue correcto"""
+    return _REDIS_OK is True
+
+
+def _probe_redis(client: "redis.Redis") -> None:
+    """Ping en segundo plano (hasta 2 s si Redis está caído)"""
+    try:
+        client.ping()
+        mark_redis(True)
+        logger.info("✅ Redis conectado exitosamente")
+    except Exception as e:
+        mark_redis(False)
+        logger.warning(f"⚠️  Redis no disponible: {e}. Usando cache en memoria.")
 
-# ==================== NEO4J (OPCIONAL) ====================
 
-neo4j_driver: Optional[Any] = None
-if settings.ENABLE_NEO4J:
+@lru_cache(maxsize=1)
+def get_redis_client() -> Optional["redis.Redis"]:
+    """Cliente Redis compartido, o None si está deshabilitado/no disponible"""
+    if not settings.ENABLE_REDIS:
+        logger.info("ℹ️  Redis deshabilitado por configuración")
+        return None
+    if redis is None:
+        logger.warning("⚠️  Redis package not installed; Redis disabled. Install `requirements-optional.txt` to enable.")
+        return None
+    try:
+        # Pool acotado y bloqueante: las conexiones se reutilizan y, si se
+        # agotan, se espera hasta 2 s en vez de abrir sockets sin límite.
+        # No abre sockets aquí: el ping se hace en segundo plano
+        redis_pool = redis.BlockingConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_POOL_SIZE,
+            timeout=2,
+            decode_responses=True,
+            socket_connect_timeout=2,
+            socket_timeout=2,
+            retry_on_timeout=False
+        )
+        client = redis.Redis(connection_pool=redis_pool)
+    except Exception as e:
+        logger.warning(f"⚠️  Redis no disponible: {e}. Usando cache en memoria.")
+        return None
+    threading.Thread(target=_probe_redis, args=(client,), name="redis-probe", daemon=True).start()
+    return client
+
+
+@lru_cache(maxsize=1)
+def get_neo4j_driver() -> Optional[Any]:
+    """Driver Neo4j compartido, o None si está deshabilitado/no disponible"""
+    if not settings.ENABLE_NEO4J:
+        logger.info("ℹ️  Neo4j deshabilitado por configuración")
+        return None
     if GraphDatabase is None:
         logger.warning("⚠️  Neo4j package not installed; Neo4j disabled. Install `requirements-optional.txt` to enable.")
-    else:
-        try:
-            neo4j_driver = GraphDatabase.driver(
-                settings.NEO4J_URI,
-                auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD),
-                connection_timeout=5
-            )
-            with neo4j_driver.session() as session:
-                session.run("RETURN 1")
-            logger.info("✅ Neo4j conectado exitosamente")
-        except Exception as e:
-            logger.warning(f"⚠️  Neo4j no disponible:  {e}. Operaciones deshabilitadas.")
-            neo4j_driver = None
-else:
-    logger.info("ℹ️  Neo4j deshabilitado por configuración")
+        return None
+    try:
+        # El driver conecta de forma perezosa: sin E/S de red aquí
+        driver = GraphDatabase.driver(
+            settings.NEO4J_URI,
+            auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD),
+            connection_timeout=5
+        )
+    except Exception as e:
+        logger.warning(f"⚠️  Neo4j no disponible:  {e}. Operaciones deshabilitadas.")
+        return None
+    return driver
+
+
+if settings.EAGER_CONNECT:
+    get_redis_client()
+    get_neo4j_driver()
 
 # ==================== FUNCIONES DE UTILIDAD ====================
 
+# Sentencia de ping compartida por /health y test_connections (un solo sitio
+# para cambiarla; sin efecto en rendimiento: text() ya cae en la caché de
+# compilación de SQLAlchemy)
+PING_SQL = text("SELECT 1")
+
 
 def get_db() -> Generator[Session, None, None]: 
     """Dependency para obtener sesión de base de datos"""
@@ -113,46 +212,63 @@ def get_db_session() -> Generator[Session, None, None]:
         db.close()
 
 
-def test_connections() -> Dict[str, Any]:
-    """Probar todas las conexiones sin lanzar excepciones"""
+def _ping_db() -> bool:
+    with engine.connect() as conn:
+        conn.execute(PING_SQL)
+    return True
+
+
+def _ping_redis() -> bool:
+    get_redis_client().ping()
+    return True
+
+
+def _ping_neo4j() -> bool:
+    with get_neo4j_driver().session() as session:
+        session.run("RETURN 1")
+    return True
+
+
+def test_connections(timeout: float = 5.0) -> Dict[str, Any]:
+    """Probar todas las conexiones sin lanzar excepciones
+
+    Los pings corren en paralelo con un plazo común: el tiempo total es el del
+    servicio más lento (acotado por ``timeout``), no la suma de todos.
+    """
     status = {
         "postgres": False,
         "redis": False,
         "neo4j": False,
     }
 
-    # Test PostgreSQL/SQLite
-    try:
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-            status["postgres"] = True
-    except Exception as e:
-        logger.error(f"❌ DB error: {e}")
-        status["postgres_error"] = str(e)
-
-    # Test Redis
-    if redis_client:
-        try: 
-            redis_client.ping()
-            status["redis"] = True
-        except Exception as e: 
-            logger.error(f"❌ Redis error: {e}")
-            status["redis_error"] = str(e)
+    # (clave, etiqueta de log, ping); servicios deshabilitados quedan en None
+    checks = [("postgres", "DB", _ping_db)]
+    if get_redis_client():
+        checks.append(("redis", "Redis", _ping_redis))
     else:
         status["redis"] = None
-
-    # Test Neo4j
-    if neo4j_driver: 
-        try:
-            with neo4j_driver.session() as session:
-                session.run("RETURN 1")
-            status["neo4j"] = True
-        except Exception as e:
-            logger.error(f"❌ Neo4j error: {e}")
-            status["neo4j_error"] = str(e)
+    if get_neo4j_driver():
+        checks.append(("neo4j", "Neo4j", _ping_neo4j))
     else:
         status["neo4j"] = None
 
+    executor = ThreadPoolExecutor(max_workers=len(checks), thread_name_prefix="ping")
+    try:
+        futures = [(key, label, executor.submit(ping)) for key, label, ping in checks]
+        deadline = time.monotonic() + timeout
+        for key, label, future in futures:
+            try:
+                status[key] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FuturesTimeoutError:
+                logger.error(f"❌ {label} error: timeout after {timeout}s")
+                status[f"{key}_error"] = f"timeout after {timeout}s"
+            except Exception as e:
+                logger.error(f"❌ {label} error: {e}")
+                status[f"{key}_error"] = str(e)
+    finally:
+        # No esperar a pings colgados más allá del plazo
+        executor.shutdown(wait=False)
+
     return status
 
 
@@ -162,62 +278,46 @@ def init_database() -> bool:
     TIMESCALEDB: try/except per tabla, no crash si falla
     """
     try: 
-        # Crear todas las tablas
-        Base.metadata.create_all(bind=engine)
-        logger.info("✅ Tablas creadas/verificadas")
-
-        # ==================== TIMESCALEDB ====================
-        if settings.ENABLE_TIMESCALE and not settings.USE_SQLITE: 
-            logger.info("🔧 Habilitando TimescaleDB...")
-
-            # Crear extensión
-            try:
-                with engine.connect() as conn:
-                    conn.execute(text("CREATE EXTENSION IF NOT EXISTS timescaledb CASCADE;"))
-                    conn.commit()
-                logger.info("✅ Extensión TimescaleDB OK")
-            except Exception as e: 
-                logger.warning(f"⚠️  Extensión error: {e}")
-
-            # Crear hypertable:  prices
-            try:
-                with engine.connect() as conn:
-                    conn.execute(text("""
-                        SELECT create_hypertable(
-                            'prices',
-                            'time',
-                            if_not_exists => TRUE
-                        );
-                    """))
-                    conn.commit()
-                logger.info("✅ Hypertable 'prices' OK")
-            except Exception as e: 
-                logger.warning(f"⚠️  prices error: {e}")
-
-            # Crear hypertable: risk_metrics
-            try:
-                with engine.connect() as conn:
-                    conn.execute(text("""
-                        SELECT create_hypertable(
-                            'risk_metrics',
-                            'time',
-                            if_not_exists => TRUE
-                        );
-                    """))
-                    conn.commit()
-                logger.info("✅ Hypertable 'risk_metrics' OK")
-            except Exception as e:
-                logger.warning(f"⚠️  risk_metrics error:  {e}")
-        else:
-            if settings.ENABLE_TIMESCALE: 
-                logger.info("ℹ️  TimescaleDB disabled (SQLite detected)")
+        # Una sola conexión para create_all y todas las secciones; cada una
+        # termina en commit (o rollback si falla) para que un error no arrastre
+        # a las siguientes. Sin SAVEPOINTs: pysqlite no los gestiona bien en
+        # modo por defecto
+        with engine.connect() as conn:
+            # Crear todas las tablas (un fallo aquí aborta el init: return False)
+            Base.metadata.create_all(bind=conn)
+            conn.commit()
+            logger.info("✅ Tablas creadas/verificadas")
+
+            # ==================== TIMESCALEDB ====================
+            if settings.ENABLE_TIMESCALE and not settings.USE_SQLITE: 
+                logger.info("🔧 Habilitando TimescaleDB...")
+
+                # Commit/rollback por sentencia: un fallo no aborta los pasos siguientes
+                timescale_steps = [
+                    ("Extensión TimescaleDB", "Extensión",
+                     "CREATE EXTENSION IF NOT EXISTS timescaledb CASCADE;"),
+                    ("Hypertable 'prices'", "prices",
+                     "SELECT create_hypertable('prices', 'time', if_not_exists => TRUE);"),
+                    ("Hypertable 'risk_metrics'", "risk_metrics",
+                     "SELECT create_hypertable('risk_metrics', 'time', if_not_exists => TRUE);"),
+                ]
+                for ok_label, err_label, stmt in timescale_steps:
+                    try:
+                        conn.execute(text(stmt))
+                        conn.commit()
+                        logger.info(f"✅ {ok_label} OK")
+                    except SQLAlchemyError as e:
+                        conn.rollback()
+                        logger.warning(f"⚠️  {err_label} error: {e}")
             else:
-                logger.info("ℹ️  TimescaleDB disabled (ENABLE_TIMESCALE=false)")
+                if settings.ENABLE_TIMESCALE: 
+                    logger.info("ℹ️  TimescaleDB disabled (SQLite detected)")
+                else:
+                    logger.info("ℹ️  TimescaleDB disabled (ENABLE_TIMESCALE=false)")
 
-        # Ensure risk_snapshots table exists (schema used by MVP risk vector)
-        # Use a safe CREATE TABLE IF NOT EXISTS so this is idempotent across runs
-        try:
-            with engine.connect() as conn:
+            # Ensure risk_snapshots table exists (schema used by MVP risk vector)
+            # Use a safe CREATE TABLE IF NOT EXISTS so this is idempotent across runs
+            try:
                 # Create table if missing
                 conn.execute(text("""
                     CREATE TABLE IF NOT EXISTS risk_snapshots (
@@ -230,44 +330,55 @@ def init_database() -> bool:
                         cp_risk REAL,
                         regime_risk REAL,
                         cri REAL,
-                        model_version VARCHAR(32)
+                        model_version VARCHAR(32),
+                        asset_name TEXT,
+                        group_name TEXT,
+                        subgroup_name TEXT,
+                        category_name TEXT,
+                        fundamental_risk REAL,
+                        liquidity_risk REAL,
+                        counterparty_risk REAL
                     );
                 """))
-                # Ensure desired columns exist; add missing ones via ALTER TABLE
+                # Fresh tables already have every column; only legacy tables
+                # created before these columns existed still need the ALTERs
                 cols = conn.execute(text("PRAGMA table_info(risk_snapshots)")).mappings().all()
                 existing = {c['name'] for c in cols}
-                if 'asset_name' not in existing:
-                    conn.execute(text("ALTER TABLE risk_snapshots ADD COLUMN asset_name TEXT"))
-                if 'group_name' not in existing:
-                    conn.execute(text("ALTER TABLE risk_snapshots ADD COLUMN group_name TEXT"))
-                if 'subgroup_name' not in existing:
-                    conn.execute(text("ALTER TABLE risk_snapshots ADD COLUMN subgroup_name TEXT"))
-                if 'category_name' not in existing:
-                    conn.execute(text("ALTER TABLE risk_snapshots ADD COLUMN category_name TEXT"))
-                if 'fundamental_risk' not in existing:
-                    conn.execute(text("ALTER TABLE risk_snapshots ADD COLUMN fundamental_risk REAL"))
-                    if 'fund_risk' in existing:
-                        conn.execute(text("UPDATE risk_snapshots SET fundamental_risk = fund_risk"))
-                if 'liquidity_risk' not in existing:
-                    conn.execute(text("ALTER TABLE risk_snapshots ADD COLUMN liquidity_risk REAL"))
-                    if 'liq_risk' in existing:
-                        conn.execute(text("UPDATE risk_snapshots SET liquidity_risk = liq_risk"))
-                if 'counterparty_risk' not in existing:
-                    conn.execute(text("ALTER TABLE risk_snapshots ADD COLUMN counterparty_risk REAL"))
-                    if 'cp_risk' in existing:
-                        conn.execute(text("UPDATE risk_snapshots SET counterparty_risk = cp_risk"))
+                # (columna, tipo, columna legacy de la que se rellena)
+                expected_cols = [
+                    ('asset_name', 'TEXT', None),
+                    ('group_name', 'TEXT', None),
+                    ('subgroup_name', 'TEXT', None),
+                    ('category_name', 'TEXT', None),
+                    ('fundamental_risk', 'REAL', 'fund_risk'),
+                    ('liquidity_risk', 'REAL', 'liq_risk'),
+                    ('counterparty_risk', 'REAL', 'cp_risk'),
+                ]
+                backfill = []
+                for col, col_type, legacy in expected_cols:
+                    if col not in existing:
+                        conn.execute(text(f"ALTER TABLE risk_snapshots ADD COLUMN {col} {col_type}"))
+                        if legacy in existing:
+                            backfill.append(f"{col} = COALESCE({col}, {legacy})")
+                # Un único UPDATE (una pasada por la tabla) para todas las columnas nuevas
+                if backfill:
+                    conn.execute(text(f"UPDATE risk_snapshots SET {', '.join(backfill)}"))
 
                 # Ensure indexes
                 conn.execute(text("CREATE INDEX IF NOT EXISTS ix_risk_snapshots_ts ON risk_snapshots(ts);"))
                 conn.execute(text("CREATE INDEX IF NOT EXISTS ix_risk_snapshots_asset_id ON risk_snapshots(asset_id);"))
                 conn.execute(text("CREATE INDEX IF NOT EXISTS ix_risk_snapshots_group_subcat ON risk_snapshots(group_name,subgroup_name,category_name);"))
-        except Exception as e:
-            logger.warning(f"⚠️ Could not ensure risk_snapshots table: {e}")
-
-        # Ensure indicator_snapshots table has required columns/indexes (SQLite-safe)
-        try:
-            if settings.USE_SQLITE:
-                with engine.connect() as conn:
+                # Lecturas de la API: serie por activo (asset_id, ts) y ranking por cri del último ts
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_risk_asset_ts ON risk_snapshots(asset_id,ts);"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_risk_snapshots_ts_cri ON risk_snapshots(ts,cri);"))
+                conn.commit()
+            except SQLAlchemyError as e:
+                conn.rollback()
+                logger.warning(f"⚠️ Could not ensure risk_snapshots table: {e}")
+
+            # Ensure indicator_snapshots table has required columns/indexes (SQLite-safe)
+            try:
+                if settings.USE_SQLITE:
                     conn.execute(text("""
                         CREATE TABLE IF NOT EXISTS indicator_snapshots (
                             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -289,8 +400,10 @@ def init_database() -> bool:
                     if 'snapshot_json' not in existing:
                         conn.execute(text("ALTER TABLE indicator_snapshots ADD COLUMN snapshot_json TEXT"))
                     conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_indicator_snapshot_symbol_tf_ts ON indicator_snapshots(symbol,timeframe,ts);"))
-        except Exception as e:
-            logger.warning(f"⚠️ Could not ensure indicator_snapshots table: {e}")
+                    conn.commit()
+            except SQLAlchemyError as e:
+                conn.rollback()
+                logger.warning(f"⚠️ Could not ensure indicator_snapshots table: {e}")
 
         return True
     except Exception as e:
@@ -5,6 +5,8 @@ SQLAlchemy 2.x compatible
 import logging
 from datetime import datetime, timedelta
 
+from sqlalchemy import insert
+
 # Inicializar logger temprano para que los mensajes de import fallido no causen NameError
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -65,18 +67,26 @@ def ingest_data():
 
                 df = df.reset_index()
 
-                for _, row in df.iterrows():
-                    price = Price(
-                        time=pd.Timestamp(row['Date']).to_pydatetime(),
-                        asset_id=asset.id,
-                        open=float(row['Open']) if pd.notna(row['Open']) else None,
-                        high=float(row['High']) if pd.notna(row['High']) else None,
-                        low=float(row['Low']) if pd.notna(row['Low']) else None,
-                        close=float(row['Close']),
-                        volume=int(row['Volume']) if pd.notna(row['Volume']) else None
+                # Insert column-wise via a single Core executemany: avoids
+                # iterrows() building a Series per row and the ORM tracking a
+                # Price object per row just to flush it once
+                asset_id = asset.id
+                rows = [
+                    {
+                        "time": pd.Timestamp(ts).to_pydatetime(),
+                        "asset_id": asset_id,
+                        "open": float(o) if pd.notna(o) else None,
+                        "high": float(h) if pd.notna(h) else None,
+                        "low": float(lo) if pd.notna(lo) else None,
+                        "close": float(c),
+                        "volume": int(v) if pd.notna(v) else None,
+                    }
+                    for ts, o, h, lo, c, v in zip(
+                        df['Date'], df['Open'], df['High'], df['Low'], df['Close'], df['Volume'],
+                        strict=True,
                     )
-                    db.add(price)
-
+                ]
+                db.execute(insert(Price), rows)
                 db.commit()
                 logger.info(f"✅ {ticker}:  {len(df)} registros insertados")
 
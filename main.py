@@ -13,10 +13,9 @@ from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 import uvicorn
-from sqlalchemy import text
 
-from config import settings
-from database import engine, get_db, init_database, test_connections, neo4j_driver
+from config import settings, redact_database_url
+from database import engine, get_db, init_database, test_connections, get_neo4j_driver, PING_SQL
 from models import Base
 from api import assets, risk, scenarios, auth, market, universe, metrics, alerts
 from services.cache_service import cache_service
@@ -59,7 +58,7 @@ async def lifespan(app: FastAPI):
     logger.info("🚀 Iniciando WallStreetWar API en Replit...")
     logger.info(f"📍 Entorno: {settings.ENVIRONMENT}")
     logger.info(f"🔧 Debug: {settings.DEBUG}")
-    logger.info(f"🔌 DB:  {settings.DATABASE_URL[: 40]}...")
+    logger.info(f"🔌 DB:  {redact_database_url(settings.DATABASE_URL)}")
 
     try:
         success = init_database()
@@ -238,7 +237,7 @@ async def root():
 async def health_check():
     try:
         with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
+            conn.execute(PING_SQL)
         db_status = "healthy"
     except Exception as e: 
         logger.error(f"❌ Health check DB failed: {e}")
@@ -253,6 +252,7 @@ async def health_check():
 
     neo4j_status = "unavailable"
     try: 
+        neo4j_driver = get_neo4j_driver()
         if neo4j_driver: 
             with neo4j_driver.session() as session:
                 session.run("RETURN 1")
@@ -168,6 +168,15 @@ class RiskSnapshot(Base):
     cp_risk: Mapped[float] = mapped_column(Float)
     regime_risk: Mapped[float] = mapped_column(Float)
 
+    # Columnas del vector de riesgo MVP (antes añadidas vía ALTER en init_database)
+    asset_name: Mapped[str | None] = mapped_column(String(200))
+    group_name: Mapped[str | None] = mapped_column(String(120))
+    subgroup_name: Mapped[str | None] = mapped_column(String(120))
+    category_name: Mapped[str | None] = mapped_column(String(140))
+    fundamental_risk: Mapped[float | None] = mapped_column(Float)
+    liquidity_risk: Mapped[float | None] = mapped_column(Float)
+    counterparty_risk: Mapped[float | None] = mapped_column(Float)
+
     cri: Mapped[float] = mapped_column(Float, index=True)
     model_version: Mapped[str] = mapped_column(String(32), default="mvp-0.1")
 
@@ -175,6 +184,7 @@ class RiskSnapshot(Base):
 
     __table_args__ = (
         Index("ix_risk_asset_ts", "asset_id", "ts"),
+        Index("ix_risk_snapshots_ts_cri", "ts", "cri"),
     )
 
 
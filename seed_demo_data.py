@@ -27,39 +27,52 @@ def seed_structure(conn, n_groups=2, subgroups_per_group=5, categories_per_subgr
     conn.execute(text("DELETE FROM subgroups"))
     conn.execute(text("DELETE FROM groups"))
 
+    # Ids come from each INSERT's cursor.lastrowid (no last_insert_rowid() round trip)
+    group_sql = text("INSERT INTO groups (name) VALUES (:name)")
     for gi in range(n_groups):
         gname = grp_names[gi] if gi < len(grp_names) else f"Group {gi+1}"
-        conn.execute(text("INSERT INTO groups (name) VALUES (:name)"), {"name": gname})
-        gid = conn.execute(text("SELECT last_insert_rowid()" )).scalar_one()
+        gid = conn.execute(group_sql, {"name": gname}).lastrowid
         group_ids.append((gid, gname))
 
     subgroup_ids = []
+    subgroup_sql = text("INSERT INTO subgroups (group_id, name) VALUES (:gid, :name)")
     for gid, gname in group_ids:
         for si in range(subgroups_per_group):
             sname = f"{gname}-Subgroup-{si+1}"
-            conn.execute(text("INSERT INTO subgroups (group_id, name) VALUES (:gid, :name)"), {"gid": gid, "name": sname})
-            sid = conn.execute(text("SELECT last_insert_rowid()" )).scalar_one()
+            sid = conn.execute(subgroup_sql, {"gid": gid, "name": sname}).lastrowid
             subgroup_ids.append((sid, sname, gid))
 
     category_ids = []
+    category_sql = text(
+        "INSERT INTO categories (subgroup_id, name) VALUES (:sid, :name)"
+    )
     for sid, sname, gid in subgroup_ids:
         for ci in range(categories_per_subgroup):
             cname = f"{sname}-Cat-{ci+1}"
-            conn.execute(text("INSERT INTO categories (subgroup_id, name) VALUES (:sid, :name)"), {"sid": sid, "name": cname})
-            cid = conn.execute(text("SELECT last_insert_rowid()" )).scalar_one()
+            cid = conn.execute(category_sql, {"sid": sid, "name": cname}).lastrowid
             category_ids.append((cid, cname, sid))
 
     asset_ids = []
-    # Build map from subgroup id to group name
-    gid_to_name = {g[0]:g[1] for g in group_ids}
+    # Assets link to the taxonomy through category_id (see models.Asset)
+    asset_sql = text(
+        "INSERT INTO assets (symbol, name, category_id, sector, exchange, country, "
+        "currency, is_active) "
+        "VALUES (:sym, :name, :category_id, :sector, :exchange, :country, "
+        ":currency, 1)"
+    )
     for cid, cname, sid in category_ids:
         for ai in range(assets_per_category):
             sym = f"AS{cid}_{ai+1}"
             aname = f"{cname}-Asset-{ai+1}"
-            group_name = gid_to_name.get(next((g for g in group_ids if g[0]==next((s[2] for s in subgroup_ids if s[0]==sid), None)), (None,''))[0], '')
-            subgroup_name = next((s[1] for s in subgroup_ids if s[0]==sid), '')
-            conn.execute(text("INSERT INTO assets (symbol, name, category, group_name, sector, exchange, country, currency, is_active) VALUES (:sym, :name, :category, :group_name, :sector, :exchange, :country, :currency, 1)"), {"sym": sym, "name": aname, "category": cname, "group_name": group_name, "sector": '', "exchange": '', "country": '', "currency": 'USD'})
-            aid = conn.execute(text("SELECT last_insert_rowid()" )).scalar_one()
+            aid = conn.execute(asset_sql, {
+                "sym": sym,
+                "name": aname,
+                "category_id": cid,
+                "sector": '',
+                "exchange": '',
+                "country": '',
+                "currency": 'USD',
+            }).lastrowid
             asset_ids.append((aid, aname, cid, sid))
 
     return group_ids, subgroup_ids, category_ids, asset_ids
@@ -85,15 +98,26 @@ def generate_snapshots(asset_rows: List[tuple], days=60, conn=None):
         for r in rows:
             grp_map[r['id']] = r['name']
 
+    # Same day grid for every asset: format the timestamps once
+    day_ts = [(now - timedelta(days=days - d - 1)).isoformat() for d in range(days)]
+
     for aid, aname, cid, sid in asset_rows:
+        # Taxonomy names only depend on the asset, not on the day
+        if sid in sub_map:
+            group_name = grp_map.get(sub_map[sid].get('group_id'), 'Unknown')
+        else:
+            group_name = 'Unknown'
+        subgroup_name = sub_map.get(sid, {}).get('name', 'Unknown')
+        category_name = cat_map.get(cid, 'Unknown')
+        asset_id = str(aid)
+
         # base random starting vector
         price = random.uniform(30, 70)
         fund = random.uniform(20, 80)
         liq = random.uniform(10, 90)
         cp = random.uniform(0, 50)
         reg = random.uniform(0, 40)
-        for d in range(days):
-            ts = now - timedelta(days=days - d - 1)
+        for ts in day_ts:
             # small random drift
             price += random.uniform(-1.5, 1.5)
             fund += random.uniform(-1.0, 1.0)
@@ -110,13 +134,9 @@ def generate_snapshots(asset_rows: List[tuple], days=60, conn=None):
 
             cri = 0.30 * price + 0.25 * fund + 0.20 * liq + 0.15 * cp + 0.10 * reg
 
-            group_name = grp_map.get(sub_map.get(sid, {}).get('group_id'), 'Unknown') if sid in sub_map else 'Unknown'
-            subgroup_name = sub_map.get(sid, {}).get('name', 'Unknown')
-            category_name = cat_map.get(cid, 'Unknown')
-
             snapshots.append({
-                'ts': ts.isoformat(),
-                'asset_id': str(aid),
+                'ts': ts,
+                'asset_id': asset_id,
                 'asset_name': aname,
                 'group_name': group_name,
                 'subgroup_name': subgroup_name,
@@ -165,40 +185,43 @@ def batch_insert_snapshots(engine_or_conn, snapshots):
     param_placeholders = ', '.join([f":{c}" for c in insert_cols])
     insert_sql = text(f"INSERT INTO risk_snapshots ({col_placeholders}) VALUES ({param_placeholders})")
 
-    for i in range(0, len(snapshots), BATCH):
-        chunk = snapshots[i:i+BATCH]
-        params = []
-        for s in chunk:
-            p = {}
-            for c in insert_cols:
-                if c in base_cols:
-                    p[c] = s[c] if c in s else (s.get('cri') if c == 'cri' else None)
-                else:
-                    # map column aliases to snapshot keys
-                    mapped = col_map.get(c, c)
-                    # provide sensible defaults for new/required columns
-                    if mapped == 'model_version' and mapped not in s:
-                        p[c] = 'v1'
-                    else:
-                        p[c] = s.get(mapped)
-            params.append(p)
-
-        # Use a fresh transaction per batch and retry on SQLITE 'database is locked'
-        retries = 5
-        backoff = 0.2
-        for attempt in range(retries):
-            try:
-                with engine_or_conn.begin() as trans_conn:
-                    trans_conn.execute(insert_sql, params)
-                print(f"Inserted batch {i // BATCH + 1} ({len(chunk)} rows)")
-                break
-            except OperationalError as e:
-                if 'database is locked' in str(e).lower() and attempt < retries - 1:
-                    wait = backoff * (2 ** attempt)
-                    print(f"Database is locked, retrying batch {i // BATCH + 1} in {wait:.2f}s (attempt {attempt+1}/{retries})")
-                    time.sleep(wait)
-                    continue
-                raise
+    # Resolve (column, snapshot key, default) once instead of per row and column;
+    # aliases map to snapshot keys and model_version defaults to 'v1'
+    fields = []
+    for c in insert_cols:
+        key = c if c in base_cols else col_map.get(c, c)
+        fields.append((c, key, 'v1' if key == 'model_version' else None))
+
+    # One connection for every batch; each batch still commits on its own
+    with engine_or_conn.connect() as conn:
+        for i in range(0, len(snapshots), BATCH):
+            chunk = snapshots[i:i+BATCH]
+            params = [
+                {c: s.get(key, default) for c, key, default in fields}
+                for s in chunk
+            ]
+
+            # Use a fresh transaction per batch and retry on SQLITE 'database is locked'
+            retries = 5
+            backoff = 0.2
+            for attempt in range(retries):
+                try:
+                    with conn.begin():
+                        conn.execute(insert_sql, params)
+                    print(f"Inserted batch {i // BATCH + 1} ({len(chunk)} rows)")
+                    break
+                except OperationalError as e:
+                    if 'database is locked' in str(e).lower() and attempt < retries - 1:
+                        wait = backoff * (2 ** attempt)
+                        print(f"Database is locked, retrying batch {i // BATCH + 1} in {wait:.2f}s (attempt {attempt+1}/{retries})")
+                        time.sleep(wait)
+                        continue
+                    raise
+
+        # Refresh planner stats once after the bulk load so the
+        # ix_risk_snapshots_* indexes get picked for the API reads
+        conn.exec_driver_sql("ANALYZE risk_snapshots")
+        conn.commit()
 
 
 def main():
@@ -10,13 +10,17 @@ import threading
 import time
 
 from config import settings
-from database import redis_client
+from database import get_redis_client, mark_redis, redis_verified
 
 logger = logging.getLogger(__name__)
 
 
 class MemoryCache:
-    """Cache en memoria simple con TTL"""
+    """Cache en memoria simple con TTL
+
+    Expiraciones con time.monotonic(): un salto del reloj del sistema no
+    caduca ni prolonga entradas.
+    """
 
     def __init__(self):
         self._cache:  Dict[str, Dict[str, Any]] = {}
@@ -27,7 +31,7 @@ class MemoryCache:
         with self._lock:
             entry = self._cache.get(key)
             if entry: 
-                if entry.get('expires_at', 0) >= time.time():
+                if entry.get('expires_at', 0) >= time.monotonic():
                     return entry.get('value')
                 else: 
                     del self._cache[key]
@@ -38,7 +42,7 @@ class MemoryCache:
         with self._lock:
             self._cache[key] = {
                 'value': value,
-                'expires_at': time.time() + ttl
+                'expires_at': time.monotonic() + ttl
             }
         return True
 
@@ -59,7 +63,7 @@ class MemoryCache:
     def get_stats(self) -> Dict[str, Any]:
         """Obtener estadísticas"""
         with self._lock:
-            now = time.time()
+            now = time.monotonic()
             active = sum(1 for e in self._cache.values() if e.get('expires_at', 0) >= now)
             return {
                 'total_entries': len(self._cache),
@@ -72,9 +76,27 @@ class CacheService:
     """Servicio de caché unificado con fallback"""
 
     def __init__(self):
-        self.redis_available = redis_client is not None
         self.memory_cache = MemoryCache()
-        logger.info(f"CacheService inicializado.  Redis:  {self.redis_available}")
+        # El cliente Redis se resuelve en el primer uso, no al importar
+        self._client = None
+        self._client_resolved = False
+        logger.info(f"CacheService inicializado.  Redis:  {settings.ENABLE_REDIS}")
+
+    def _get_redis(self):
+        """Cliente Redis (None si deshabilitado); construirlo lanza el probe"""
+        if not self._client_resolved:
+            self._client = get_redis_client()
+            self._client_resolved = True
+        return self._client
+
+    @property
+    def redis_available(self) -> bool:
+        """Redis solo tras un ping correcto del probe en segundo plano
+
+        Mientras el probe está pendiente (o falló) se usa la memoria: sin
+        esperas de socket_timeout por cada get/set contra un Redis caído.
+        """
+        return self._get_redis() is not None and redis_verified()
 
     def initialize(self):
         """Inicializar servicio"""
@@ -82,33 +104,49 @@ class CacheService:
 
     def is_connected(self) -> bool:
         """Verificar conexión a Redis"""
-        if self.redis_available:
+        client = self._get_redis()
+        if client is not None:
+            # Ping en vivo; refresca el flag del probe para que la caché se
+            # recupere (o se degrade) sin reiniciar el proceso
             try:
-                redis_client.ping()
+                client.ping()
+                mark_redis(True)
                 return True
             except:
+                mark_redis(False)
                 return False
         return False
 
     def get_json(self, key: str) -> Optional[Any]:
         """Obtener JSON del cache"""
-        try:
-            if self.redis_available and redis_client:
-                value = redis_client.get(key)
-                if value:
+        if self.redis_available:
+            try:
+                value = self._client.get(key)
+            except:
+                # Redis caído tras el probe: memoria hasta el próximo ping correcto
+                mark_redis(False)
+                value = None
+            if value:
+                try:
                     return json.loads(value)
-        except:
-            pass
+                except:
+                    pass
 
         return self.memory_cache.get(key)
 
     def set_json(self, key: str, value:  Any, ttl: int = 300) -> bool:
         """Establecer JSON en cache"""
-        try:
-            if self.redis_available and redis_client: 
-                redis_client.setex(key, ttl, json.dumps(value))
-        except:
-            pass
+        if self.redis_available:
+            try:
+                payload = json.dumps(value)
+            except:
+                payload = None
+            if payload is not None:
+                try:
+                    self._client.setex(key, ttl, payload)
+                except:
+                    # Redis caído tras el probe: memoria hasta el próximo ping correcto
+                    mark_redis(False)
 
         return self.memory_cache.set(key, value, ttl)
 
@@ -118,9 +156,12 @@ class CacheService:
 
     def close(self):
         """Cerrar conexiones"""
-        if self.redis_available and redis_client:
+        # Sin construir el cliente si nunca se llegó a usar
+        if self._client is not None:
             try:
-                redis_client.close()
+                self._client.close()
+                # El pool se creó fuera del cliente: close() no lo desconecta
+                self._client.connection_pool.disconnect()
             except:
                 pass
 
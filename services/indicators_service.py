@@ -7,6 +7,7 @@ from typing import Any, Dict, List, Sequence
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
 
+from database import DIALECT_INSERT
 from models import IndicatorSnapshot
 
 MIN_BARS_FOR_INDICATORS = 20
@@ -38,9 +39,11 @@ def sma(values: Sequence[float], period: int) -> float | None:
 def rsi(values: Sequence[float], period: int = 14) -> float | None:
     if len(values) <= period:
         return None
+    # Only the last `period` deltas count: no need to walk the whole series
     gains: List[float] = []
     losses: List[float] = []
-    for i in range(1, len(values)):
+    start = len(values) - period
+    for i in range(start, len(values)):
         delta = values[i] - values[i - 1]
         if delta > 0:
             gains.append(delta)
@@ -48,8 +51,8 @@ def rsi(values: Sequence[float], period: int = 14) -> float | None:
         else:
             gains.append(0.0)
             losses.append(abs(delta))
-    avg_gain = sum(gains[-period:]) / period
-    avg_loss = sum(losses[-period:]) / period
+    avg_gain = sum(gains) / period
+    avg_loss = sum(losses) / period
     if avg_loss == 0:
         return 100.0
     rs = avg_gain / avg_loss
@@ -202,31 +205,47 @@ def persist_snapshot(db: Session, snapshot: Dict[str, Any]) -> IndicatorSnapshot
     indicators = snapshot.get("indicators") or {}
     risk = snapshot.get("risk") or {}
 
+    values = {
+        "symbol": symbol,
+        "timeframe": timeframe,
+        "ts": ts_val,
+        "sma_20": indicators.get("sma20"),
+        "rsi_14": indicators.get("rsi14"),
+        "risk_v0": risk.get("score_total_0_100"),
+        "explain_json": risk.get("components"),
+        "snapshot_json": snapshot,
+    }
+
+    dialect = db.get_bind().dialect
+    # RETURNING needs driver support (e.g. SQLite >= 3.35); otherwise fall back
+    dialect_insert = DIALECT_INSERT.get(dialect.name) if dialect.insert_returning else None
+    if dialect_insert is not None:
+        # Single-statement upsert on ix_indicator_snapshot_symbol_tf_ts
+        stmt = dialect_insert(IndicatorSnapshot).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["symbol", "timeframe", "ts"],
+            set_={k: getattr(stmt.excluded, k) for k in ("sma_20", "rsi_14", "risk_v0", "explain_json", "snapshot_json")},
+        ).returning(IndicatorSnapshot)
+        db_obj = db.scalars(stmt, execution_options={"populate_existing": True}).one()
+        db.commit()
+        return db_obj
+
     existing = db.query(IndicatorSnapshot).filter(
         IndicatorSnapshot.symbol == symbol,
         IndicatorSnapshot.timeframe == timeframe,
         IndicatorSnapshot.ts == ts_val,
     ).first()
     if existing:
-        existing.sma_20 = indicators.get("sma20")
-        existing.rsi_14 = indicators.get("rsi14")
-        existing.risk_v0 = risk.get("score_total_0_100")
-        existing.explain_json = risk.get("components")
+        existing.sma_20 = values["sma_20"]
+        existing.rsi_14 = values["rsi_14"]
+        existing.risk_v0 = values["risk_v0"]
+        existing.explain_json = values["explain_json"]
         existing.snapshot_json = snapshot
         db.commit()
         db.refresh(existing)
         return existing
 
-    db_obj = IndicatorSnapshot(
-        symbol=symbol,
-        timeframe=timeframe,
-        ts=ts_val,
-        sma_20=indicators.get("sma20"),
-        rsi_14=indicators.get("rsi14"),
-        risk_v0=risk.get("score_total_0_100"),
-        explain_json=risk.get("components"),
-        snapshot_json=snapshot,
-    )
+    db_obj = IndicatorSnapshot(**values)
     db.add(db_obj)
     db.commit()
     db.refresh(db_obj)
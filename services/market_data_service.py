@@ -8,6 +8,7 @@ from typing import Any, Dict, List
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
 
+from database import DIALECT_INSERT
 from models import PriceBar
 from services.cache_service import cache_service
 
@@ -127,26 +128,44 @@ def get_bars(symbol: str, interval: str = "1d", limit: int = 200, use_cache: boo
 
 
 def persist_price_bars(db: Session, symbol: str, bars: List[Dict[str, Any]]) -> Tuple[int, int]:
-    """Best-effort idempotent persistence of bars to PriceBar."""
-    inserted = 0
+    """Best-effort idempotent persistence of bars to PriceBar.
+
+    One ``INSERT ... ON CONFLICT DO NOTHING RETURNING id`` against
+    ``uq_price_bars_symbol_ts`` replaces the per-bar existence query; the
+    returned ids give the inserted count.
+    """
+    rows = []
     for bar in bars:
         ts = _ensure_datetime(bar.get("ts"))
         if ts is None:
             continue
-        exists = db.query(PriceBar).filter(PriceBar.symbol == symbol, PriceBar.ts == ts).first()
-        if exists:
-            continue
-        db.add(PriceBar(
-            symbol=symbol,
-            ts=ts,
-            open=bar.get("open"),
-            high=bar.get("high"),
-            low=bar.get("low"),
-            close=bar.get("close"),
-            volume=bar.get("volume"),
-            source=bar.get("source", "yfinance")
-        ))
-        inserted += 1
+        rows.append({
+            "symbol": symbol,
+            "ts": ts,
+            "open": bar.get("open"),
+            "high": bar.get("high"),
+            "low": bar.get("low"),
+            "close": bar.get("close"),
+            "volume": bar.get("volume"),
+            "source": bar.get("source", "yfinance"),
+        })
+
+    inserted = 0
+    if rows:
+        dialect = db.get_bind().dialect
+        # RETURNING needs driver support (e.g. SQLite >= 3.35); otherwise fall back
+        dialect_insert = DIALECT_INSERT.get(dialect.name) if dialect.insert_returning else None
+        if dialect_insert is not None:
+            stmt = dialect_insert(PriceBar).on_conflict_do_nothing().returning(PriceBar.id)
+            inserted = len(db.execute(stmt, rows).all())
+        else:
+            # Generic fallback: check for an existing row one bar at a time
+            for row in rows:
+                exists = db.query(PriceBar.id).filter(PriceBar.symbol == symbol, PriceBar.ts == row["ts"]).first()
+                if exists:
+                    continue
+                db.add(PriceBar(**row))
+                inserted += 1
     db.commit()
     total = db.query(PriceBar).filter(PriceBar.symbol == symbol).count()
     return inserted, total
@@ -24,12 +24,13 @@ class RateLimiter:
         self.cleanup_interval = cleanup_interval
         
         # token_bucket[ip] = (tokens_remaining, last_refill_time, last_access_time)
+        # Times come from time.monotonic(): wall-clock/NTP steps can't refill or drain buckets
         self.token_bucket: Dict[str, Tuple[float, float, float]] = {}
-        self.last_cleanup = time.time()
+        self.last_cleanup = time.monotonic()
     
     def is_allowed(self, ip: str) -> bool:
         """Check if request from IP is allowed under rate limit"""
-        now = time.time()
+        now = time.monotonic()
         
         # Periodic cleanup
         if now - self.last_cleanup > self.cleanup_interval:
@@ -6,11 +6,14 @@ Runs a lightweight asyncio loop to avoid blocking the event loop.
 """
 
 import logging
+import math
 import uuid
 from datetime import datetime
 import asyncio
 from typing import Optional
 
+from sqlalchemy.orm import Session
+
 from database import SessionLocal
 from models import Asset, AssetMetricSnapshot, Alert
 from services.metrics_registry import registry, CoreMetricsComputer
@@ -30,9 +33,15 @@ class JobContext:
         logger.log(getattr(logging, level.upper(), logging.INFO), f"[{self.job_id}] {msg}")
 
 
-async def recompute_metrics_for_asset(asset_id: int, ctx: JobContext):
-    """Recompute metrics for a single asset"""
-    db = SessionLocal()
+async def recompute_metrics_for_asset(asset_id: int, ctx: JobContext, db: Optional[Session] = None):
+    """Recompute metrics for a single asset
+
+    Reuses ``db`` when given (batch callers keep one session for the whole run);
+    otherwise opens and closes its own session.
+    """
+    owns_session = db is None
+    if owns_session:
+        db = SessionLocal()
     try:
         ctx.log("info", f"Starting metrics recomputation for asset {asset_id}")
 
@@ -90,7 +99,8 @@ async def recompute_metrics_for_asset(asset_id: int, ctx: JobContext):
         ctx.log("error", f"Error recomputing metrics for asset {asset_id}: {e}")
         db.rollback()
     finally:
-        db.close()
+        if owns_session:
+            db.close()
 
 
 async def recompute_all_active_assets(limit: int = 50, ctx: Optional[JobContext] = None):
@@ -102,18 +112,20 @@ async def recompute_all_active_assets(limit: int = 50, ctx: Optional[JobContext]
     try:
         ctx.log("info", f"Starting batch metrics recomputation (limit={limit})")
 
-        # Get active assets
-        assets = (
-            db.query(Asset)
+        # Get active asset ids (plain ints: per-asset commits on the shared
+        # session would otherwise expire and reload each Asset row)
+        asset_ids = [
+            row.id
+            for row in db.query(Asset.id)
             .filter(Asset.is_active == True)
             .limit(limit)
             .all()
-        )
+        ]
 
-        ctx.log("info", f"Found {len(assets)} active assets to process")
+        ctx.log("info", f"Found {len(asset_ids)} active assets to process")
 
-        for asset in assets:
-            await recompute_metrics_for_asset(asset.id, ctx)
+        for asset_id in asset_ids:
+            await recompute_metrics_for_asset(asset_id, ctx, db=db)
 
         ctx.log("info", f"Batch metrics recomputation complete")
 
@@ -161,6 +173,11 @@ scheduler = Scheduler(enabled=False)  # Set via environment variable in main.py
 
 async def scheduler_loop(interval_minutes: int, batch_size: int):
     """Background loop that periodically recomputes metrics and alerts"""
+    loop = asyncio.get_running_loop()
+    interval = max(1, interval_minutes) * 60
+    # Fixed-rate schedule on the loop's monotonic clock: batch duration does
+    # not push later runs back
+    deadline = loop.time()
     # Run forever until cancelled
     while True:
         ctx = JobContext()
@@ -172,8 +189,11 @@ async def scheduler_loop(interval_minutes: int, batch_size: int):
             break
         except Exception as e:
             logger.error(f"[{ctx.job_id}] Scheduler loop error: {e}")
-        # Sleep until next interval
-        await asyncio.sleep(max(1, interval_minutes) * 60)
+        # Sleep until the next slot; if a batch overran, skip the missed slots
+        # (next future slot) instead of running back-to-back
+        now = loop.time()
+        deadline += interval * max(1, math.ceil((now - deadline) / interval))
+        await asyncio.sleep(max(0.0, deadline - now))
 
 
 def create_scheduler_task(interval_minutes: int, batch_size: int) -> asyncio.Task:
@@ -0,0 +1,27 @@
+"""
+Test CacheService fallback when Redis dies after the startup probe
+"""
+import database
+from services.cache_service import CacheService
+
+
+class _DeadRedis:
+    def get(self, key):
+        raise ConnectionError("redis down")
+
+    def setex(self, key, ttl, value):
+        raise ConnectionError("redis down")
+
+
+def test_redis_error_marks_redis_down_and_uses_memory(monkeypatch):
+    monkeypatch.setattr(database, "_REDIS_OK", True)
+    cache = CacheService()
+    cache._client = _DeadRedis()
+    cache._client_resolved = True
+
+    assert cache.redis_available
+    assert cache.set_json("k", {"a": 1}) is True
+    # First failure flips the flag: later calls skip Redis entirely
+    assert not database.redis_verified()
+    assert not cache.redis_available
+    assert cache.get_json("k") == {"a": 1}
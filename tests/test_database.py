@@ -0,0 +1,68 @@
+"""
+Test init_database against a legacy-shaped risk_snapshots table
+"""
+import sqlite3
+
+from sqlalchemy import create_engine
+
+import database
+
+
+def test_init_database_upgrades_legacy_risk_snapshots(tmp_path, monkeypatch):
+    db_path = tmp_path / "legacy.db"
+    raw = sqlite3.connect(db_path)
+    raw.execute("""
+        CREATE TABLE risk_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts TEXT NOT NULL,
+            asset_id TEXT,
+            price_risk REAL,
+            liq_risk REAL,
+            fund_risk REAL,
+            cp_risk REAL,
+            regime_risk REAL,
+            cri REAL,
+            model_version VARCHAR(32)
+        )
+    """)
+    raw.execute(
+        "INSERT INTO risk_snapshots (ts, asset_id, liq_risk, fund_risk, cp_risk, cri) "
+        "VALUES ('2024-01-01', '1', 1.5, 2.5, 3.5, 9.0)"
+    )
+    raw.commit()
+    raw.close()
+
+    legacy_engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    monkeypatch.setattr(database, "engine", legacy_engine)
+    try:
+        assert database.init_database() is True
+    finally:
+        legacy_engine.dispose()
+
+    # Fresh connection: only committed changes are visible
+    raw = sqlite3.connect(db_path)
+    try:
+        cols = {row[1] for row in raw.execute("PRAGMA table_info(risk_snapshots)")}
+        assert {"asset_name", "group_name", "subgroup_name", "category_name",
+                "fundamental_risk", "liquidity_risk", "counterparty_risk"} <= cols
+
+        row = raw.execute(
+            "SELECT fundamental_risk, liquidity_risk, counterparty_risk FROM risk_snapshots"
+        ).fetchone()
+        assert row == (2.5, 1.5, 3.5)
+
+        indexes = {row[1] for row in raw.execute("PRAGMA index_list(risk_snapshots)")}
+        assert {"ix_risk_snapshots_ts", "ix_risk_snapshots_asset_id",
+                "ix_risk_snapshots_group_subcat", "ix_risk_asset_ts",
+                "ix_risk_snapshots_ts_cri"} <= indexes
+    finally:
+        raw.close()
+
+
+def test_libpq_connect_args_only_for_libpq_drivers():
+    """libpq conninfo keys are only passed to psycopg2/psycopg"""
+    assert database._driver_name("postgresql://u:p@h/db") in database.LIBPQ_DRIVERS
+    assert database._driver_name("postgresql+psycopg://u:p@h/db") in database.LIBPQ_DRIVERS
+    assert database._driver_name("postgresql+pg8000://u:p@h/db") not in database.LIBPQ_DRIVERS
+    assert database._driver_name("postgresql+asyncpg://u:p@h/db") not in database.LIBPQ_DRIVERS
+    assert database._driver_name("not a url") == ''
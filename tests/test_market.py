@@ -2,6 +2,8 @@ from datetime import datetime, timedelta
 
 from fastapi.testclient import TestClient
 
+from database import SessionLocal
+from models import IndicatorSnapshot, PriceBar
 from services import market_data_service
 
 
@@ -62,3 +64,100 @@ def test_snapshot_insufficient_data(client: TestClient, monkeypatch):
     error = payload.get("error") or {}
     assert error.get("code") == 422
     assert "Not enough data" in error.get("message", "")
+
+
+def test_snapshot_persist_bars_is_idempotent(client: TestClient, monkeypatch):
+    symbol = "PERSISTTEST"
+    db = SessionLocal()
+    try:
+        db.query(PriceBar).filter(PriceBar.symbol == symbol).delete()
+        db.query(IndicatorSnapshot).filter(IndicatorSnapshot.symbol == symbol).delete()
+        db.commit()
+    finally:
+        db.close()
+
+    # The endpoint swallows persistence errors: record results (or exceptions) here
+    persisted = []
+    real_persist_bars = market_data_service.persist_price_bars
+
+    def spy_persist_bars(db, sym, bars):
+        try:
+            result = real_persist_bars(db, sym, bars)
+        except Exception as exc:
+            persisted.append(exc)
+            raise
+        persisted.append(result)
+        return result
+
+    monkeypatch.setattr(market_data_service, "persist_price_bars", spy_persist_bars)
+
+    # 30 distinct timestamps plus a duplicate of the first bar in the same batch
+    first_bars = _fake_bars(30)
+    first_bars.insert(1, dict(first_bars[0]))
+    monkeypatch.setattr(market_data_service, "get_bars", lambda *args, **kwargs: first_bars)
+
+    response = client.get(f"/api/market/snapshot?symbol={symbol}&interval=1d&limit=31&persist=true")
+    assert response.status_code == 200
+    assert persisted == [(30, 30)]
+
+    # Same timestamps, different prices: bars are kept, the snapshot is updated in place
+    second_bars = [dict(bar, close=bar["close"] + 50) for bar in _fake_bars(30)]
+    monkeypatch.setattr(market_data_service, "get_bars", lambda *args, **kwargs: second_bars)
+
+    response = client.get(f"/api/market/snapshot?symbol={symbol}&interval=1d&limit=30&persist=true")
+    assert response.status_code == 200
+    assert persisted == [(30, 30), (0, 30)]
+    sma20 = response.json()["indicators"]["sma20"]
+
+    db = SessionLocal()
+    try:
+        rows = db.query(IndicatorSnapshot).filter(IndicatorSnapshot.symbol == symbol).all()
+        assert len(rows) == 1
+        assert rows[0].sma_20 == sma20
+        assert rows[0].snapshot_json["indicators"]["sma20"] == sma20
+    finally:
+        db.close()
+
+
+def test_persist_without_insert_returning(tmp_path):
+    """Drivers without INSERT ... RETURNING (SQLite < 3.35) use the generic paths"""
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+
+    from database import Base
+    from services import indicators_service
+
+    old_engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    # What the SQLite dialect sets for sqlite < 3.35, before any statement runs
+    old_engine.dialect.insert_returning = False
+    old_engine.dialect.update_returning = False
+    old_engine.dialect.delete_returning = False
+    Base.metadata.create_all(bind=old_engine)
+
+    # SQLAlchemy does not reject RETURNING itself; old SQLite fails at execute time
+    statements = []
+
+    @event.listens_for(old_engine, "before_cursor_execute")
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    symbol = "NORETURNING"
+    snapshot = indicators_service.compute_snapshot(symbol, _fake_bars(30), timeframe="1d")
+
+    db = sessionmaker(bind=old_engine)()
+    try:
+        bars = _fake_bars(30)
+        assert market_data_service.persist_price_bars(db, symbol, bars) == (30, 30)
+        assert market_data_service.persist_price_bars(db, symbol, bars) == (0, 30)
+
+        indicators_service.persist_snapshot(db, snapshot)
+        changed = dict(snapshot, indicators=dict(snapshot["indicators"], sma20=1.0))
+        indicators_service.persist_snapshot(db, changed)
+
+        rows = db.query(IndicatorSnapshot).filter(IndicatorSnapshot.symbol == symbol).all()
+        assert len(rows) == 1
+        assert rows[0].sma_20 == 1.0
+        assert not [st for st in statements if "RETURNING" in st.upper()]
+    finally:
+        db.close()
+        old_engine.dispose()